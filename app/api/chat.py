@@ -1,19 +1,27 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
+import numpy as np
+import json
 import logging
 from app.services.embeddings import embedding_service
 from app.services.vector_store import vector_store
 from app.services.llm import llm_service
+from app.services.chat_cache import chat_cache
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
+NO_RESULTS_REPLY = "I couldn't find any relevant information in the uploaded documents to answer your question."
+PREVIEW_LENGTH = 200
+
 class ChatRequest(BaseModel):
     message: str
     file_ids: Optional[List[str]] = None  # Optional: search specific files only
     top_k: int = 5  # Number of relevant chunks to retrieve
+    include_previews: bool = False  # Return a 200 char preview of each source chunk
 
 class Source(BaseModel):
     filename: str
@@ -26,69 +34,161 @@ class ChatResponse(BaseModel):
     sources: List[Source]
     num_sources: int
 
-@router.post("/", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+def validate_request(request: ChatRequest) -> None:
     """
-    Chat with your documents using RAG
+    Validate the chat request
+    Raise Exception if the message is empty
     """
     if not request.message or not request.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty")
-   
+
     logger.info(f"Received chat request: {request.message[:50]}...")
-   
+
+async def embed_query(request: ChatRequest) -> np.ndarray:
+    """
+    Generate the embedding for the user question
+    """
     # Generte embedding for user question
     logger.info("Generating query embedding...")
-    query_embedding = embedding_service.generate_single_embedding(request.message)
-   
+    return await embedding_service.embed_async(request.message)
+
+async def retrieve_context(
+    request: ChatRequest, query_embedding: np.ndarray
+) -> Tuple[List[Source], str]:
+    """
+    Fetch the chunks most relevant to the question
+    Returns:
+        Sources for the response and the joined context for the LLM
+    """
     # Search Pinecone for relevant chunks
     logger.info(f"Searching for top {request.top_k} relevant chunks...")
-   
+
     filter_dict = None
     if request.file_ids:
         # Search only in specific files
         filter_dict = {"file_id": {"$in": request.file_ids}}
-   
-    search_results = vector_store.search(
+
+    search_results = await vector_store.search_async(
         query_embedding=query_embedding,
         top_k=request.top_k,
         filter_dict=filter_dict
     )
-   
-    if not search_results.matches:
-        return ChatResponse(
-            reply="I couldn't find any relevant information in the uploaded documents to answer your question.",
-            sources=[],
-            num_sources=0
-        )
-   
+
     # Extract context from search results
     context_chunks = []
     sources = []
-   
+
     for match in search_results.matches:
         chunk_text = match.metadata.get("chunk_text", "")
         context_chunks.append(chunk_text)
-       
+
+        # Preview only, and only when asked for
+        preview = ""
+        if request.include_previews:
+            preview = chunk_text if len(chunk_text) <= PREVIEW_LENGTH else f"{chunk_text[:PREVIEW_LENGTH]}..."
+
         sources.append(Source(
             filename=match.metadata.get("filename", "Unknown"),
-            chunk_text=chunk_text[:200] + "...",  # Preview only
+            chunk_text=preview,
             chunk_index=match.metadata.get("chunk_index", 0),
             similarity_score=round(match.score, 4)
         ))
-   
+
     logger.info(f"Retrieved {len(context_chunks)} relevant chunks")
-   
-    # Generate response using LLM
-    logger.info("Generating response with LLM...")
-    context = "\n\n".join(context_chunks)
-   
-    llm_response = llm_service.generate_response(
-        query=request.message,
-        context=context
+    return sources, "\n\n".join(context_chunks)
+
+def sse_format(sources: List[Source], tokens: Iterator[str]) -> Iterator[str]:
+    """
+    Encode a chat reply as Server-Sent Events
+    Sends one sources event, a token event per text chunk, then done
+    (or error if generation fails midway)
+    """
+    sources_data = json.dumps([source.model_dump() for source in sources])
+    yield f"event: sources\ndata: {sources_data}\n\n"
+
+    try:
+        for token in tokens:
+            yield f"event: token\ndata: {json.dumps(token)}\n\n"
+    except Exception as e:
+        yield f"event: error\ndata: {json.dumps(str(e))}\n\n"
+        return
+
+    yield "event: done\ndata: {}\n\n"
+
+def cache_scope(request: ChatRequest) -> str:
+    """Request fields other than the message that change the answer"""
+    return f"{request.top_k}|{request.include_previews}|{','.join(sorted(request.file_ids or []))}"
+
+@router.post("/", response_model=ChatResponse)
+async def chat(request: ChatRequest):
+    """
+    Chat with your documents using RAG
+    """
+    validate_request(request)
+
+    scope = cache_scope(request)
+    version = await chat_cache.get_version()
+    cache_key = chat_cache.make_key(request.message, scope, version)
+
+    cached = await chat_cache.get(cache_key)
+    if cached is not None:
+        logger.info("Exact cache hit")
+        return ChatResponse(**cached)
+
+    query_embedding = await embed_query(request)
+
+    cached = await chat_cache.get_similar(query_embedding, scope, version)
+    if cached is not None:
+        return ChatResponse(**cached)
+
+    sources, context = await retrieve_context(request, query_embedding)
+
+    if not sources:
+        response = ChatResponse(
+            reply=NO_RESULTS_REPLY,
+            sources=[],
+            num_sources=0
+        )
+    else:
+        # Generate response using LLM
+        logger.info("Generating response with LLM...")
+
+        llm_response = await llm_service.generate_response_async(
+            query=request.message,
+            context=context
+        )
+
+        response = ChatResponse(
+            reply=llm_response,
+            sources=sources,
+            num_sources=len(sources)
+        )
+
+    await chat_cache.set(cache_key, scope, version, query_embedding, response.model_dump())
+    return response
+
+@router.post("/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Chat with your documents using RAG, streaming the reply as Server-Sent Events
+    """
+    validate_request(request)
+
+    query_embedding = await embed_query(request)
+    sources, context = await retrieve_context(request, query_embedding)
+
+    if not sources:
+        tokens = iter([NO_RESULTS_REPLY])
+    else:
+        logger.info("Streaming response from LLM...")
+        tokens = llm_service.generate_response_stream(
+            query=request.message,
+            context=context
+        )
+
+    # sync generator, starlette iterates it in a threadpool so the
+    # blocking Gemini stream doesn't hold the event loop
+    return StreamingResponse(
+        sse_format(sources, tokens),
+        media_type="text/event-stream"
     )
-   
-    return ChatResponse(
-        reply=llm_response,
-        sources=sources,
-        num_sources=len(sources)
-    )
\ No newline at end of file
@@ -1,5 +1,8 @@
 from fastapi import APIRouter, File, UploadFile, HTTPException
 from pathlib import Path
+from typing import Dict, List
+import aiofiles
+import asyncio
 import uuid
 from datetime import datetime
 import logging
@@ -11,10 +14,13 @@ from app.services.document_processor import (
 
 from app.services.embeddings import embedding_service
 from app.services.vector_store import vector_store  # Add this import
+from app.services.chat_cache import chat_cache
+from app.services.file_index import file_index
+from app.services.executors import run_blocking
 
 from app.config import (
-  UPLOAD_DIR, MAX_FILE_SIZE_MB,
-  ALLOWED_EXTENSIONS, CHUNK_SIZE, CHUNK_OVERLAP
+  UPLOAD_DIR, MAX_FILE_SIZE_MB, UPLOAD_READ_CHUNK_BYTES,
+  ALLOWED_EXTENSIONS, CHUNK_SIZE, CHUNK_OVERLAP, PINECONE_UPSERT_CONCURRENCY
 )
 
 logger = logging.getLogger(__name__)
@@ -41,6 +47,82 @@ def validate_file(file: UploadFile) -> None:
       detail="No file provided"
     )
 
+async def embed_and_store(
+  file_id: str, filename: str, chunks: List[str], additional_metadata: Dict
+) -> int:
+  """
+  Embed chunks and store them in Pinecone, pipelined per batch so
+  embedding batch N (cpu) overlaps the upserts of earlier batches (network),
+  with up to PINECONE_UPSERT_CONCURRENCY upserts in flight
+  Returns number of vectors stored
+  """
+
+  # maxsize keeps embedding from running far ahead of the upserts
+  queue = asyncio.Queue(maxsize=2)
+  # several upserts in flight at once, each batch is a single pinecone request
+  semaphore = asyncio.Semaphore(PINECONE_UPSERT_CONCURRENCY)
+  upserts = []
+
+  async def embed_batches():
+    batch_size = embedding_service.upload_batch_size
+    for start in range(0, len(chunks), batch_size):
+      batch = chunks[start:start + batch_size]
+      embeddings = await run_blocking(
+        embedding_service.generate_embeddings_cached, batch
+      )
+      await queue.put((start, batch, embeddings))
+    await queue.put(None)
+
+  async def upsert_batch(start, batch, embeddings):
+    try:
+      return await vector_store.upsert_chunks_async(
+        file_id=file_id,
+        filename=filename,
+        chunks=batch,
+        embeddings=embeddings,
+        additional_metadata=additional_metadata,
+        start_index=start
+      )
+    finally:
+      semaphore.release()
+
+  def stop_on_failure(upsert):
+    # no point embedding the rest of a document whose upload already failed
+    if not upsert.cancelled() and upsert.exception() is not None:
+      for task in tasks:
+        task.cancel()
+
+  async def upsert_batches():
+    while (item := await queue.get()) is not None:
+      # acquired here, not in the task, so a full pipeline stops pulling from the queue
+      await semaphore.acquire()
+      upsert = asyncio.create_task(upsert_batch(*item))
+      upsert.add_done_callback(stop_on_failure)
+      upserts.append(upsert)
+
+  tasks = [
+    asyncio.create_task(embed_batches()),
+    asyncio.create_task(upsert_batches())
+  ]
+  try:
+    await asyncio.gather(*tasks)
+    num_vectors = sum(await asyncio.gather(*upserts))
+  except (Exception, asyncio.CancelledError):
+    # a failed stage would leave the other blocked on the queue
+    # (the upserts themselves are not cancelled, see below)
+    for task in tasks:
+      task.cancel()
+    # upserts run in threads and can't be cancelled, wait them out so the
+    # caller's cleanup doesn't race a late write
+    await asyncio.gather(*tasks, *upserts, return_exceptions=True)
+    # raise the upsert error rather than the cancellation it caused
+    for upsert in upserts:
+      if not upsert.cancelled() and upsert.exception() is not None:
+        raise upsert.exception()
+    raise
+
+  return num_vectors
+
 @router.post("/")
 async def upload_file(file: UploadFile = File(...)):
   """
@@ -51,16 +133,6 @@ async def upload_file(file: UploadFile = File(...)):
 
   # validate file
   validate_file(file)
-  # read content
-  contents = await file.read()
-
-  # check file size
-  file_size_mb = len(contents) / (1024 * 1024)
-  if file_size_mb > MAX_FILE_SIZE_MB:
-    raise HTTPException(
-      status_code=413,
-      detail=f"File too large. Max Size: {MAX_FILE_SIZE_MB}MB"
-    )
 
   # generate unique file_name
   file_id = str(uuid.uuid4())
@@ -68,16 +140,33 @@ async def upload_file(file: UploadFile = File(...)):
   unique_filename = f"{file_id}{file_extension}"
   file_path = UPLOAD_DIR / unique_filename
 
-  # save file
-  with open(file_path, "wb") as f:
-    f.write(contents)
-
+  # stream to disk in chunks so the handler never holds the whole file in memory.
+  # by now starlette has already spooled the request body, so the size check
+  # here only bounds the file kept on disk. Oversized requests with a
+  # Content-Length are rejected earlier by the limit_upload_size middleware
+  max_bytes = MAX_FILE_SIZE_MB * 1024 * 1024
+  size_bytes = 0
+  try:
+    async with aiofiles.open(file_path, "wb") as f:
+      while chunk := await file.read(UPLOAD_READ_CHUNK_BYTES):
+        size_bytes += len(chunk)
+        if size_bytes > max_bytes:
+          raise HTTPException(
+            status_code=413,
+            detail=f"File too large. Max Size: {MAX_FILE_SIZE_MB}MB"
+          )
+        await f.write(chunk)
+  except Exception:
+    file_path.unlink(missing_ok=True)
+    raise
+
+  file_size_mb = size_bytes / (1024 * 1024)
   logger.info(f"File saved: {file_path}")
 
   # extract text
   try:
     logger.info(f"Extracting text from document...")
-    extracted_text = process_document(file_path)
+    extracted_text = await process_document(file_path)
 
     if not extracted_text or not extracted_text.strip():
       raise ValueError("No text could be extracted from the document")
@@ -93,47 +182,58 @@ async def upload_file(file: UploadFile = File(...)):
 
     logger.info(f"Created {len(chunks)} chunks")
 
-    # embeds
-    logger.info(f"Generating embeddings...")
-    embeddings = embedding_service.generate_embeddings(chunks)
-
-    logger.info(f"Generated {len(embeddings)} embeddings")
-
-    # store in pinecone
-    logger.info("Storing embeddings in Pinecone...")
-    num_vectors = vector_store.upsert_chunks(
+    # embed and store in pinecone
+    logger.info("Generating embeddings and storing in Pinecone...")
+    upload_date = datetime.now().isoformat()
+    num_vectors = await embed_and_store(
         file_id=file_id,
         filename=file.filename,
         chunks=chunks,
-        embeddings=embeddings,
         additional_metadata={
-            "upload_date": datetime.now().isoformat(),
+            "upload_date": upload_date,
             "file_size_mb": round(file_size_mb, 2)
         }
     )
     
     logger.info(f"Successfully stored {num_vectors} vectors in Pinecone")
 
+    await file_index.add(
+      file_id=file_id,
+      filename=file.filename,
+      ext=file_extension,
+      size=size_bytes,
+      upload_date=upload_date
+    )
+
+    # cached chat answers don't know about this document
+    await chat_cache.bump_version()
+
     # response message
     return {
       "success": True,
       "file_id": file_id,
       "filename": file.filename,
-      "size_bytes": len(contents),
+      "size_bytes": size_bytes,
       "size_mb": round(file_size_mb, 2),
       "text_length": len(extracted_text),
       "num_chunks": len(chunks),
-      "num_embeddings": len(embeddings),
+      "num_embeddings": len(chunks),
       "vectors_stored": num_vectors,
-      "embedding_dimension": len(embeddings[0]) if embeddings else 0,
-      "upload_date": datetime.now().isoformat(),
+      "embedding_dimension": embedding_service.embedding_dim,
+      "upload_date": upload_date,
       "message": "File uploaded, processed, and stored in vector database successfully"
     }
     
   except Exception as e:
     # clean up if processing failes
     logger.error(f"Processing failed: {str(e)}")
-    file_path.unlink()
+    file_path.unlink(missing_ok=True)
+
+    # batches may already be in pinecone, and without an index row
+    # delete_file can't reach them
+    if not await vector_store.delete_by_file_id_async(file_id):
+      logger.error(f"Failed to remove partial vectors for file {file_id}")
+
     raise HTTPException(
       status_code=500,
       detail=f"Failed to process document: {str(e)}"
@@ -145,16 +245,7 @@ async def list_files():
   List all uploaded files
   """
 
-  files = []
-  for file_path in UPLOAD_DIR.iterdir():
-    if file_path.is_file():
-      files.append({
-        "filename": file_path.name,
-        "size": file_path.stat().st_size,
-        "upload_date": datetime.fromtimestamp(
-            file_path.stat().st_ctime
-        ).isoformat()      
-       })
+  files = await file_index.list_files()
 
   return {
     "files" : files,
@@ -167,24 +258,22 @@ async def delete_file(file_id: str):
   Delete an uploaded file
   """
 
-  found = False
-  for file_path in UPLOAD_DIR.iterdir():
-    if file_path.stem == file_id:
-      # deletes from file path
-      file_path.unlink()
-      found = True
-
-      # Delete from Pinecone
-      logger.info(f"Deleting vectors for file {file_id} from Pinecone")
-      vector_store.delete_by_file_id(file_id)
-      break
-
-  if not found:
+  file_extension = await file_index.get_ext(file_id)
+  if file_extension is None:
     raise HTTPException(
       status_code=404,
       detail="File not found"
     )
 
+  # deletes from file path
+  (UPLOAD_DIR / f"{file_id}{file_extension}").unlink(missing_ok=True)
+
+  # Delete from Pinecone
+  logger.info(f"Deleting vectors for file {file_id} from Pinecone")
+  await vector_store.delete_by_file_id_async(file_id)
+  await file_index.delete(file_id)
+  await chat_cache.bump_version()
+
   return {
     "success" : True,
     "message" : "File deleted successfully" 
@@ -196,7 +285,7 @@ async def get_vector_stats():
     Get statistics about the vector database
     """
     try:
-        stats = vector_store.get_index_stats()
+        stats = await vector_store.get_index_stats_async()
         return {
             "success": True,
             "stats": stats
@@ -9,7 +9,11 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 UPLOAD_DIR = BASE_DIR / "uploads"
 UPLOAD_DIR.mkdir(exist_ok=True)
 MAX_FILE_SIZE_MB = 15
+UPLOAD_READ_CHUNK_BYTES = 1 << 20
+# room for multipart boundaries and part headers on top of the file itself
+UPLOAD_MULTIPART_OVERHEAD_BYTES = 64 * 1024
 ALLOWED_EXTENSIONS = {".pdf", ".txt", ".docx"}
+FILE_INDEX_PATH = BASE_DIR / "file_index.db"
 
 # chunking
 CHUNK_SIZE = 1000
@@ -17,10 +21,36 @@ CHUNK_OVERLAP = 200
 
 # Embedding Settings
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# onnx export of the model, built with: python -m scripts.build_embedding_model
+EMBEDDING_ONNX_DIR = BASE_DIR / "onnx" / "minilm"
+# int8 dynamic quantized variant, used on cpus with avx512 vnni
+EMBEDDING_ONNX_INT8_DIR = BASE_DIR / "onnx" / "minilm-int8"
+EMBEDDING_MAX_SEQ_LENGTH = 256
+# micro-batching of concurrent chat query embeddings
+EMBEDDING_BATCH_MAX_SIZE = 32
+EMBEDDING_BATCH_MAX_WAIT_MS = 8
+# upload pipeline: chunks per embed -> upsert stage hand-off
+EMBED_UPSERT_BATCH_SIZE = 64
+# same, when uploads are embedded on a cuda gpu
+EMBEDDING_GPU_BATCH_SIZE = 256
+
+# shared thread pool for blocking pinecone / gemini / file calls
+THREAD_POOL_WORKERS = 32
 
 # pinecone shit
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "faux-rag-documents")
+# max upsert batches in flight at once, keeps us under rate limits
+PINECONE_UPSERT_CONCURRENCY = 8
+
+# caches
+CACHE_DIR = BASE_DIR / "cache"
+# chunk hash -> embedding, skips re-embedding repeated chunks
+CHUNK_HASH_CACHE_DIR = CACHE_DIR / "chunk_hash"
+# chat responses
+CHAT_CACHE_DIR = CACHE_DIR / "chat"
+CHAT_CACHE_SIMILARITY_THRESHOLD = 0.97
+CHAT_CACHE_MAX_SEMANTIC_ENTRIES = 10_000
 
 # llm stuff
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -1,15 +1,26 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+
+from app.config import MAX_FILE_SIZE_MB, UPLOAD_MULTIPART_OVERHEAD_BYTES
 
 # router imports
 from app.api.upload import router as upload_router
 from app.api.chat import router as chat_router 
 
+from app.services.document_processor import (
+  start_process_pool, shutdown_process_pool
+)
+from app.services.file_index import file_index
+from app.services.executors import start_thread_pool, shutdown_thread_pool
+from app.services.embeddings import embedding_service
+
 # 
 app = FastAPI(
   title = "FAUX - RAG CHATBOT APP",
   description="Document upload and RAG powered chat API",
-  version="1.0"
+  version="1.0",
+  default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -21,10 +32,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# starlette parses the whole multipart body before the upload handler runs,
+# so oversized uploads are turned away here, before any of it is read
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+  if request.method == "POST" and request.url.path.startswith("/upload"):
+    max_bytes = MAX_FILE_SIZE_MB * 1024 * 1024 + UPLOAD_MULTIPART_OVERHEAD_BYTES
+    content_length = request.headers.get("content-length")
+    if content_length is not None and content_length.isdigit() and int(content_length) > max_bytes:
+      return ORJSONResponse(
+        status_code=413,
+        content={"detail": f"File too large. Max Size: {MAX_FILE_SIZE_MB}MB"}
+      )
+  return await call_next(request)
+
 # routers
 app.include_router(upload_router)
 app.include_router(chat_router)  
 
+# worker pools and connections live for the whole app so their startup cost is paid once
+@app.on_event("startup")
+async def startup():
+  start_thread_pool()
+  start_process_pool()
+  await file_index.connect()
+  embedding_service.warmup()
+
+@app.on_event("shutdown")
+async def shutdown():
+  shutdown_thread_pool()
+  shutdown_process_pool()
+  await file_index.close()
+
 @app.get("/")
 def read_root():
     return {
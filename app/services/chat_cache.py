@@ -0,0 +1,178 @@
+import diskcache
+import faiss
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import logging
+import re
+
+from app.services.executors import run_blocking
+from app.config import (
+    CHAT_CACHE_DIR, CHAT_CACHE_SIMILARITY_THRESHOLD, CHAT_CACHE_MAX_SEMANTIC_ENTRIES
+)
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_query(text: str) -> str:
+    """Lowercase and collapse whitespace so trivially different questions share a key"""
+    return _WHITESPACE.sub(" ", text.strip().lower())
+
+class ChatCache:
+    """
+    Two level cache of chat responses
+
+    Exact tier: sha256 of the normalized query, stored on disk
+    Semantic tier: in-memory FAISS index of past query embeddings, a hit is the
+    nearest previous query above the cosine similarity threshold
+
+    Keys carry a corpus version that is bumped on every upload/delete, so stale
+    answers are never served after the documents change
+    """
+
+    def __init__(
+        self,
+        cache_dir=CHAT_CACHE_DIR,
+        threshold: float = CHAT_CACHE_SIMILARITY_THRESHOLD,
+        max_semantic_entries: int = CHAT_CACHE_MAX_SEMANTIC_ENTRIES
+    ):
+        """
+        Args:
+            cache_dir: Directory for the on-disk cache
+            threshold: Minimum cosine similarity for a semantic hit
+            max_semantic_entries: Semantic index is reset once it holds this many queries
+        """
+        self.cache = diskcache.Cache(str(cache_dir))
+        self.threshold = threshold
+        self.max_semantic_entries = max_semantic_entries
+
+        # semantic tier, rows map to (cache key, scope)
+        self._index: Optional[faiss.IndexFlatIP] = None
+        self._entries: List[Tuple[str, str]] = []
+        self._index_version: Optional[int] = None
+
+    async def get_version(self) -> int:
+        """
+        Current corpus version, read once per request and passed to the other calls
+
+        Returns:
+            Corpus version
+        """
+        return await run_blocking(self.cache.get, "corpus_version", 0)
+
+    async def bump_version(self) -> None:
+        """Invalidate all cached responses, call whenever the document set changes"""
+        version = await run_blocking(self.cache.incr, "corpus_version", default=0)
+        logger.info(f"Chat cache corpus version is now {version}")
+
+    def make_key(self, message: str, scope: str, version: int) -> str:
+        """
+        Build the cache key for a question, take it before doing any work so a
+        concurrent upload can't get a stale answer stored under the new version
+
+        Args:
+            message: User question
+            scope: Anything else that changes the answer (filters, top_k)
+            version: Corpus version from get_version
+
+        Returns:
+            Versioned cache key
+        """
+        digest = hashlib.sha256(
+            f"{scope}\x00{normalize_query(message)}".encode()
+        ).hexdigest()
+        return f"chat:{version}:{digest}"
+
+    def _sync_index(self, version: int) -> bool:
+        """
+        Drop the semantic index if it belongs to an older corpus version or is full
+
+        Returns:
+            False if the request's version is older than the index, its
+            answers must not be served or stored
+        """
+        if self._index_version is not None and version < self._index_version:
+            return False
+        if self._index_version != version or len(self._entries) >= self.max_semantic_entries:
+            self._index = None
+            self._entries = []
+            self._index_version = version
+        return True
+
+    async def get(self, key: str) -> Optional[Dict]:
+        """
+        Exact match lookup
+
+        Args:
+            key: Key from make_key
+
+        Returns:
+            Cached response or None
+        """
+        return await run_blocking(self.cache.get, key)
+
+    async def get_similar(
+        self, query_embedding: np.ndarray, scope: str, version: int
+    ) -> Optional[Dict]:
+        """
+        Semantic lookup using the already computed query embedding
+
+        Args:
+            query_embedding: Normalized query vector
+            scope: Anything else that changes the answer (filters, top_k)
+            version: Corpus version from get_version
+
+        Returns:
+            Cached response of a near-duplicate question or None
+        """
+        if not self._sync_index(version) or self._index is None:
+            return None
+
+        query = query_embedding.reshape(1, -1)
+        scores, rows = self._index.search(query, min(4, len(self._entries)))
+
+        for score, row in zip(scores[0], rows[0]):
+            if row < 0 or score < self.threshold:
+                break
+            key, entry_scope = self._entries[row]
+            if entry_scope == scope:
+                response = await self.get(key)
+                if response is not None:
+                    logger.info(f"Semantic cache hit (similarity {score:.4f})")
+                    return response
+
+        return None
+
+    async def set(
+        self,
+        key: str,
+        scope: str,
+        version: int,
+        query_embedding: np.ndarray,
+        response: Dict
+    ) -> None:
+        """
+        Store a response in both tiers
+
+        Args:
+            key: Key from make_key
+            scope: Anything else that changes the answer (filters, top_k)
+            version: Corpus version the key was built with
+            query_embedding: Normalized query vector
+            response: Serializable chat response
+        """
+        await run_blocking(self.cache.set, key, response)
+
+        # skip the semantic tier if a newer corpus version has been seen meanwhile
+        if not self._sync_index(version):
+            return
+
+        query = query_embedding.reshape(1, -1)
+        if self._index is None:
+            self._index = faiss.IndexFlatIP(query.shape[1])
+        self._index.add(query)
+        self._entries.append((key, scope))
+
+# Create singleton instance
+chat_cache = ChatCache()
@@ -1,21 +1,75 @@
 from pathlib import Path
-from PyPDF2 import PdfReader
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import asyncio
+import os
+import re
+import fitz
 from docx import Document
-from typing import List
-from langchain_text_splitters import RecursiveCharacterTextSplitter  # Changed this line
+from typing import List, Optional
 
-def extract_text_from_pdf(file_path: Path) -> str:
+from app.services.executors import run_blocking
+
+# pdf extraction workers, started with the app
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+# below this many pages per worker the ipc overhead outweighs the speedup
+_MIN_PAGES_PER_WORKER = 16
+
+def start_process_pool() -> None:
+  """Start the shared process pool used for pdf extraction"""
+  global _process_pool
+
+  if _process_pool is None:
+    # spawn, not fork: the parent already runs onnxruntime threads
+    _process_pool = ProcessPoolExecutor(
+      max_workers=os.cpu_count(),
+      mp_context=multiprocessing.get_context("spawn")
+    )
+
+def shutdown_process_pool() -> None:
+  """Stop the shared process pool"""
+  global _process_pool
+
+  if _process_pool is not None:
+    # don't block the event loop in the async shutdown hook
+    _process_pool.shutdown(wait=False, cancel_futures=True)
+    _process_pool = None
+
+def _extract_page_range(file_path: Path, start: int, end: int) -> str:
   """
-  Extract text from PDF file
+  Extract text from pages [start, end) of a PDF file
   """
-  text = []
+  with fitz.open(file_path) as doc:
+    return "\n".join(doc[i].get_text("text") for i in range(start, end))
 
-  with open(file_path, 'rb') as file:
-    reader = PdfReader(file)
-    for page in reader.pages:
-      text.append(page.extract_text())
+def _page_count(file_path: Path) -> int:
+  """
+  Number of pages in a PDF file
+  """
+  with fitz.open(file_path) as doc:
+    return doc.page_count
 
-  return "\n".join(text)
+async def extract_text_from_pdf(file_path: Path) -> str:
+  """
+  Extract text from PDF file, fanning page ranges across the process pool
+  """
+  # opening parses the xref table, keep it off the event loop
+  page_count = await run_blocking(_page_count, file_path)
+
+  num_ranges = min(os.cpu_count() or 1, page_count // _MIN_PAGES_PER_WORKER)
+  if _process_pool is None or num_ranges <= 1:
+    return await run_blocking(_extract_page_range, file_path, 0, page_count)
+
+  bounds = [page_count * i // num_ranges for i in range(num_ranges + 1)]
+  loop = asyncio.get_running_loop()
+  parts = await asyncio.gather(*[
+    loop.run_in_executor(_process_pool, _extract_page_range, file_path, start, end)
+    for start, end in zip(bounds, bounds[1:])
+  ])
+
+  return "\n".join(parts)
 
 def extract_text_from_docx(file_path: Path) -> str:
   """Extract text from DOCX file"""
@@ -37,7 +91,7 @@ def extract_text_from_txt(file_path: Path) -> str:
     with open(file_path, 'r', encoding='latin-1') as file:
       return file.read()
 
-def process_document(file_path: Path) -> str:
+async def process_document(file_path: Path) -> str:
   """
   Process Document and extract based on file type
   """
@@ -45,16 +99,19 @@ def process_document(file_path: Path) -> str:
   file_type = file_path.suffix.lower()
 
   if file_type == '.pdf':
-    return extract_text_from_pdf(file_path)
+    return await extract_text_from_pdf(file_path)
   elif file_type == '.docx':
-    return extract_text_from_docx(file_path)
+    return await run_blocking(extract_text_from_docx, file_path)
   elif file_type == '.txt':
-    return extract_text_from_txt(file_path)
+    return await run_blocking(extract_text_from_txt, file_path)
   else:
     raise ValueError(f"Unsupported file type : {file_type}")
 
 
 # CHUNKING
+# split points, captured so the separator stays attached to its text
+_SEP = re.compile(r"(\n\n|\n|\. | )")
+
 def chunk_text(
   text: str, chunk_size: int = 1000, chunk_overlap: int = 200
 ) -> List[str]:
@@ -72,15 +129,35 @@ def chunk_text(
   if not text or not text.strip():
     return []
 
-  splitter = RecursiveCharacterTextSplitter(
-    chunk_size=chunk_size,
-    chunk_overlap=chunk_overlap,
-    length_function=len,
-    separators=["\n\n", "\n", ". ", " ", ""]
-  )
+  parts = _SEP.split(text)
+
+  chunks = []
+  window = deque()
+  window_len = 0
+
+  # parts alternate text, separator, text, ...
+  for i in range(0, len(parts), 2):
+    segment = parts[i] + parts[i + 1] if i + 1 < len(parts) else parts[i]
+
+    # a single run with no separator can still be longer than a chunk
+    for start in range(0, len(segment), chunk_size):
+      piece = segment[start:start + chunk_size]
+
+      if window and window_len + len(piece) > chunk_size:
+        chunks.append("".join(window).strip())
+
+        # keep a tail of at most chunk_overlap chars that still leaves room for piece
+        while window and (
+          window_len > chunk_overlap or window_len + len(piece) > chunk_size
+        ):
+          window_len -= len(window.popleft())
+
+      window.append(piece)
+      window_len += len(piece)
 
-  chunks = splitter.split_text(text)
+  if window:
+    chunks.append("".join(window).strip())
 
-  chunks = [chunk for chunk in chunks if len(chunk.strip()) > 50 ]
+  chunks = [chunk for chunk in chunks if len(chunk) > 50 ]
 
-  return chunks
\ No newline at end of file
+  return chunks
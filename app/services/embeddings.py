@@ -1,63 +1,325 @@
-from sentence_transformers import SentenceTransformer
-from typing import List
+import onnxruntime as ort
+import cpuinfo
+import diskcache
+import xxhash
+from transformers import AutoTokenizer
+import numpy as np
+from pathlib import Path
+from typing import Callable, List, Optional
+import asyncio
 import logging
+import os
+import threading
+import time
 
-# makes logger specify origin file  
+from app.services.executors import run_blocking
+from app.config import (
+  EMBEDDING_ONNX_DIR, EMBEDDING_ONNX_INT8_DIR, EMBEDDING_MAX_SEQ_LENGTH,
+  EMBEDDING_BATCH_MAX_SIZE, EMBEDDING_BATCH_MAX_WAIT_MS, CHUNK_HASH_CACHE_DIR,
+  EMBED_UPSERT_BATCH_SIZE, EMBEDDING_GPU_BATCH_SIZE
+)
+
+# makes logger specify origin file
 logger = logging.getLogger(__name__)
 
+def _supports_vnni() -> bool:
+  """Check if the cpu has avx512 vnni int8 dot product instructions"""
+  return "avx512_vnni" in cpuinfo.get_cpu_info().get("flags", [])
+
+def _supports_cuda() -> bool:
+  """Check if onnxruntime was built with cuda (onnxruntime-gpu) for this host"""
+  return "CUDAExecutionProvider" in ort.get_available_providers()
+
+class DynamicBatcher:
+  """
+  Coalesces concurrent single-text embedding requests into one batched forward pass
+  """
+
+  def __init__(
+    self,
+    encode: Callable[[List[str]], np.ndarray],
+    max_batch: int = EMBEDDING_BATCH_MAX_SIZE,
+    max_wait_ms: int = EMBEDDING_BATCH_MAX_WAIT_MS
+  ):
+    """
+    Args:
+    encode: function embedding a list of texts into a 2D array
+    max_batch: maximum number of texts per forward pass
+    max_wait_ms: how long to wait for more texts after the first one arrives
+    """
+
+    self.encode = encode
+    self.max_batch = max_batch
+    self.max_wait = max_wait_ms / 1000
+    self._queue: Optional[asyncio.Queue] = None
+    self._worker: Optional[asyncio.Task] = None
+
+  async def submit(self, text: str) -> np.ndarray:
+    """
+    Queue a text and wait for its embedding
+    """
+
+    # queue and worker are bound to the running loop, so start lazily
+    if self._worker is None or self._worker.done():
+      self._queue = asyncio.Queue()
+      self._worker = asyncio.create_task(self._run())
+
+    future = asyncio.get_running_loop().create_future()
+    await self._queue.put((text, future))
+    return await future
+
+  async def _collect(self) -> list:
+    """
+    Block for the first request, then gather more until the batch is full or the window closes
+    """
+
+    batch = [await self._queue.get()]
+    deadline = time.monotonic() + self.max_wait
+
+    while len(batch) < self.max_batch:
+      remaining = deadline - time.monotonic()
+      if remaining <= 0:
+        break
+      try:
+        batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+      except asyncio.TimeoutError:
+        break
+
+    return batch
+
+  async def _run(self) -> None:
+    """
+    Background task draining the queue
+    """
+
+    while True:
+      batch = await self._collect()
+      texts = [text for text, _ in batch]
+
+      try:
+        # session.run releases the GIL, keep it off the event loop
+        embeddings = await run_blocking(self.encode, texts)
+      except Exception as e:
+        logger.error(f"Batched embedding failed: {str(e)}")
+        for _, future in batch:
+          if not future.done():
+            future.set_exception(e)
+        continue
+
+      logger.debug(f"Embedded batch of {len(texts)} queries")
+      for (_, future), embedding in zip(batch, embeddings):
+        # caller may have gone away (client disconnect cancels the future)
+        if not future.done():
+          future.set_result(embedding)
+
 class EmbeddingService:
   """
-  Service for generating text embeddings using Sentence Transformers
+  Service for generating text embeddings using an ONNX Runtime export of the Sentence Transformer
   """
 
-  def __init__ (self, model_name: str="all-MiniLM-L6-v2"):
+  def __init__ (
+    self,
+    model_dir: Path = EMBEDDING_ONNX_DIR,
+    int8_model_dir: Path = EMBEDDING_ONNX_INT8_DIR
+  ):
     """
-    Initialize the embedding model
+    Initialize the onnxruntime sessions and tokenizer
 
-    Args: 
-    model_name: name of the sentence transofrmer used
+    Chat queries always run on the cpu session, where small batches have the
+    lowest latency. When a cuda gpu is available, upload batches run on a
+    second gpu session instead
+
+    Args:
+    model_dir: directory holding the exported model.onnx and tokenizer files
+    int8_model_dir: directory holding the quantized model_quantized.onnx
     """
 
-    logger.info(f"Loading embedding mode: {model_name}")
-    self.model = SentenceTransformer(model_name)
-    self.embedding_dim = self.model.get_sentence_embedding_dimension()
+    fp32_model_path = model_dir / "model.onnx"
+    int8_model_path = int8_model_dir / "model_quantized.onnx"
+
+    # gpu session for uploads, fp32 since dynamic int8 ops have no cuda kernels
+    self.gpu_session: Optional[ort.InferenceSession] = None
+    self.upload_batch_size = EMBED_UPSERT_BATCH_SIZE
+    if _supports_cuda():
+      logger.info(f"CUDA available, loading {fp32_model_path} on GPU for uploads")
+      gpu_options = ort.SessionOptions()
+      gpu_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+      gpu_session = ort.InferenceSession(
+        str(fp32_model_path),
+        gpu_options,
+        providers=["CUDAExecutionProvider", "CPUExecutionProvider"]
+      )
+
+      # ORT quietly falls back to cpu when no gpu is usable or cuda libs fail to load
+      if gpu_session.get_providers()[0] == "CUDAExecutionProvider":
+        self.gpu_session = gpu_session
+        self.upload_batch_size = EMBEDDING_GPU_BATCH_SIZE
+      else:
+        logger.warning("CUDA session fell back to CPU, embedding uploads on CPU")
+
+    # int8 model only pays off with vnni, otherwise keep fp32. Also fp32 when
+    # documents are embedded on the gpu, so queries and documents in the
+    # index come from the same model
+    model_path = fp32_model_path
+    if self.gpu_session is None and int8_model_path.exists() and _supports_vnni():
+      model_path = int8_model_path
+
+    logger.info(f"Loading embedding model: {model_path}")
+
+    sess_options = ort.SessionOptions()
+    sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    sess_options.intra_op_num_threads = os.cpu_count() or 0
+
+    self.session = ort.InferenceSession(
+      str(model_path),
+      sess_options,
+      providers=["CPUExecutionProvider"]
+    )
+    self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+    self.embedding_dim = self.session.get_outputs()[0].shape[-1]
+    self.batcher = DynamicBatcher(self._encode)
+    # one io binding per thread and session, they hold per-call state
+    self._local = threading.local()
+
+    # cached vectors are only valid for the model that produced them
+    self.model_tag = model_path.parent.name
+    self.chunk_cache = diskcache.Index(str(CHUNK_HASH_CACHE_DIR))
     logger.info(f"Model loaded. Embedding dimension: {self.embedding_dim}")
 
+  def _io_binding(self, session: ort.InferenceSession) -> ort.IOBinding:
+    if not hasattr(self._local, "bindings"):
+      self._local.bindings = {}
+    binding = self._local.bindings.get(id(session))
+    if binding is None:
+      binding = self._local.bindings[id(session)] = session.io_binding()
+    return binding
 
-  def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+  def _encode(
+    self,
+    texts: List[str],
+    out: Optional[np.ndarray] = None,
+    session: Optional[ort.InferenceSession] = None
+  ) -> np.ndarray:
     """
-      Generate embeddings for a list of texts
+    Run one batch through the model, mean pooling and L2 normalization
+    are part of the graph so this returns final sentence vectors
+
+    Inputs are bound straight from the tokenizer arrays and the output is
+    written in place into out, so ORT allocates and copies nothing per call.
+    On the gpu session ORT does the one host->device and device->host copy
+    of the bound buffers itself
+    """
+    session = session or self.session
+
+    encoded = self.tokenizer(
+      texts,
+      padding=True,
+      truncation=True,
+      max_length=EMBEDDING_MAX_SEQ_LENGTH,
+      return_tensors="np"
+    )
+
+    if out is None:
+      out = np.empty((len(texts), self.embedding_dim), dtype=np.float32)
+
+    binding = self._io_binding(session)
+    for name in self.input_names:
+      binding.bind_cpu_input(name, encoded[name])
+    binding.bind_output(
+      "sentence_embedding", "cpu", 0, np.float32, out.shape, out.ctypes.data
+    )
+
+    try:
+      session.run_with_iobinding(binding)
+    finally:
+      binding.clear_binding_inputs()
+      binding.clear_binding_outputs()
+
+    return out
+
+  def generate_embeddings(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+    """
+      Generate embeddings for a list of texts, on the gpu when available
       Args:
-          texts: List of text strings to embed      
+          texts: List of text strings to embed
+          batch_size: Number of texts per forward pass, defaults to 256 on gpu, 32 on cpu
       Returns:
-          List of embedding vectors
+          float32 array of shape (len(texts), embedding_dim)
     """
 
+    embeddings = np.empty((len(texts), self.embedding_dim), dtype=np.float32)
     if not texts:
-      return []
+      return embeddings
+
+    session = self.gpu_session or self.session
+    if batch_size is None:
+      batch_size = EMBEDDING_GPU_BATCH_SIZE if self.gpu_session else 32
 
     logger.info(f"Generating embeddings for {len(texts)} texts")
-    embeddings = self.model.encode(
-      texts,
-      show_progress_bar=True,
-      convert_to_numpy=True
-    )
+    for start in range(0, len(texts), batch_size):
+      self._encode(
+        texts[start:start + batch_size],
+        out=embeddings[start:start + batch_size],
+        session=session
+      )
 
-    return embeddings.tolist()
+    return embeddings
 
-  def generate_single_embedding(self, text: str) -> List[float]:
+  def generate_embeddings_cached(self, texts: List[str]) -> np.ndarray:
+    """
+      Generate embeddings for a list of texts, reusing vectors of texts seen before
+      (repeated headers, footers, boilerplate) within and across documents
+      Args:
+          texts: List of text strings to embed
+      Returns:
+          float32 array of shape (len(texts), embedding_dim)
     """
-    Generate embedding for  a single text
+
+    embeddings = np.empty((len(texts), self.embedding_dim), dtype=np.float32)
+
+    # hash -> positions of texts that still need embedding
+    misses = {}
+    for i, text in enumerate(texts):
+      key = f"{self.model_tag}:{xxhash.xxh3_64_hexdigest(text.encode())}"
+      cached = self.chunk_cache.get(key)
+      if cached is not None:
+        embeddings[i] = np.frombuffer(cached, dtype=np.float32)
+      else:
+        misses.setdefault(key, []).append(i)
+
+    logger.info(f"Chunk cache: {len(texts) - sum(map(len, misses.values()))}/{len(texts)} hits")
+
+    if misses:
+      new_embeddings = self.generate_embeddings(
+        [texts[positions[0]] for positions in misses.values()]
+      )
+      for (key, positions), embedding in zip(misses.items(), new_embeddings):
+        embeddings[positions] = embedding
+        self.chunk_cache[key] = embedding.tobytes()
+
+    return embeddings
+
+  def warmup(self) -> None:
+    """
+    Run the model once at batch sizes used by uploads and chat, so kernel
+    selection and arena allocation happen before the first real request
+    """
+
+    logger.info("Warming up embedding model...")
+    self.generate_embeddings(["warmup"] * 8)
+    self._encode(["warmup"])
+
+  async def embed_async(self, text: str) -> np.ndarray:
+    """
+    Generate embedding for a single text, batched with other concurrent callers
     Args:
         text: Text string to embed
     Returns:
-        Embedding vector  
+        Embedding vector
     """
 
-    # generates list and picks first and only item of the list
-    embedding = self.model.encode([text])[0]
-    return embedding.tolist()
+    return await self.batcher.submit(text)
 
-# singleton instance of Embedding Service class 
+# singleton instance of Embedding Service class
 embedding_service = EmbeddingService()
-
@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+import asyncio
+import functools
+import logging
+
+from app.config import THREAD_POOL_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# shared pool for blocking calls (pinecone, gemini, file parsing) made from
+# async handlers, started with the app
+_thread_pool: Optional[ThreadPoolExecutor] = None
+
+def start_thread_pool() -> None:
+  """Start the shared thread pool"""
+  global _thread_pool
+
+  if _thread_pool is None:
+    logger.info(f"Starting thread pool with {THREAD_POOL_WORKERS} workers")
+    _thread_pool = ThreadPoolExecutor(
+      max_workers=THREAD_POOL_WORKERS,
+      thread_name_prefix="blocking-io"
+    )
+
+def shutdown_thread_pool() -> None:
+  """Stop the shared thread pool"""
+  global _thread_pool
+
+  if _thread_pool is not None:
+    # don't wait, this runs inside the async shutdown hook and running
+    # gemini/pinecone calls would block the event loop
+    _thread_pool.shutdown(wait=False, cancel_futures=True)
+    _thread_pool = None
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+  """
+  Run a blocking function on the shared pool so the event loop stays free
+  Falls back to the loop's default executor if the pool isn't started
+  """
+  loop = asyncio.get_running_loop()
+  return await loop.run_in_executor(
+    _thread_pool, functools.partial(func, *args, **kwargs)
+  )
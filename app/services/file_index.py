@@ -0,0 +1,140 @@
+import aiosqlite
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+import logging
+
+from app.config import FILE_INDEX_PATH, UPLOAD_DIR
+
+logger = logging.getLogger(__name__)
+
+class FileIndex:
+    """
+    SQLite index of uploaded files, so listing and deleting never scan the upload directory
+    """
+
+    def __init__(self, db_path: Path = FILE_INDEX_PATH):
+        """
+        Args:
+            db_path: Location of the sqlite database
+        """
+        self.db_path = db_path
+        self.db: Optional[aiosqlite.Connection] = None
+
+    async def connect(self) -> None:
+        """Open the database and create the table, called on app startup"""
+        logger.info(f"Opening file index: {self.db_path}")
+        self.db = await aiosqlite.connect(self.db_path)
+        self.db.row_factory = aiosqlite.Row
+
+        await self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                file_id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                ext TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                upload_date TEXT NOT NULL
+            )
+            """
+        )
+        await self.db.commit()
+        await self._backfill()
+
+    async def _backfill(self) -> None:
+        """
+        Index files uploaded before the index existed, one directory scan on first run
+
+        user_version marks that the scan happened, so an index emptied by
+        deletes is not refilled on the next start
+        """
+        async with self.db.execute("PRAGMA user_version") as cursor:
+            (user_version,) = await cursor.fetchone()
+        if user_version >= 1:
+            return
+
+        rows = []
+        for file_path in UPLOAD_DIR.iterdir():
+            if file_path.is_file():
+                stat = file_path.stat()
+                rows.append((
+                    file_path.stem,
+                    file_path.name,  # original name was never stored
+                    file_path.suffix,
+                    stat.st_size,
+                    datetime.fromtimestamp(stat.st_ctime).isoformat()
+                ))
+
+        if rows:
+            logger.info(f"Backfilling file index with {len(rows)} existing uploads")
+            # same stem with two extensions only keeps the first, rather than
+            # failing startup on the primary key
+            await self.db.executemany("INSERT OR IGNORE INTO files VALUES (?, ?, ?, ?, ?)", rows)
+        await self.db.execute("PRAGMA user_version = 1")
+        await self.db.commit()
+
+    async def close(self) -> None:
+        """Close the database, called on app shutdown"""
+        if self.db is not None:
+            await self.db.close()
+            self.db = None
+
+    async def add(
+        self, file_id: str, filename: str, ext: str, size: int, upload_date: str
+    ) -> None:
+        """
+        Record an uploaded file
+
+        Args:
+            file_id: Unique identifier for the file
+            filename: Original filename
+            ext: File extension as stored on disk
+            size: Size in bytes
+            upload_date: ISO formatted upload time
+        """
+        await self.db.execute(
+            "INSERT INTO files VALUES (?, ?, ?, ?, ?)",
+            (file_id, filename, ext, size, upload_date)
+        )
+        await self.db.commit()
+
+    async def list_files(self) -> List[Dict]:
+        """
+        Get all indexed files
+
+        Returns:
+            List of file records
+        """
+        async with self.db.execute(
+            "SELECT file_id, filename, size, upload_date FROM files ORDER BY upload_date"
+        ) as cursor:
+            return [dict(row) for row in await cursor.fetchall()]
+
+    async def get_ext(self, file_id: str) -> Optional[str]:
+        """
+        Get the stored extension of a file
+
+        Args:
+            file_id: File identifier
+
+        Returns:
+            Extension, or None if the file isn't indexed
+        """
+        async with self.db.execute(
+            "SELECT ext FROM files WHERE file_id = ?", (file_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        return row["ext"] if row is not None else None
+
+    async def delete(self, file_id: str) -> None:
+        """
+        Remove a file record
+
+        Args:
+            file_id: File identifier
+        """
+        await self.db.execute("DELETE FROM files WHERE file_id = ?", (file_id,))
+        await self.db.commit()
+
+# Create singleton instance
+file_index = FileIndex()
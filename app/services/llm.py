@@ -1,6 +1,8 @@
 import google.generativeai as genai
+from typing import Iterator
 import logging
 from app.config import GEMINI_API_KEY
+from app.services.executors import run_blocking
 
 logger = logging.getLogger(__name__)
 
@@ -17,18 +19,15 @@ class LLMService:
         logger.info("Initializing Gemini...")
         genai.configure(api_key=GEMINI_API_KEY)
         self.model = genai.GenerativeModel('gemini-2.0-flash')
-        logger.info("Gemini initialized successfully")
-    
-    def generate_response(self, query: str, context: str) -> str:
-        """
-        Generate response based on query and context
-        Args:
-            query: User's question
-            context: Retrieved document context  
-        Returns:
-            Generated response
-        """
-        prompt = f"""
+
+        # built once, reused for every request
+        self.gen_cfg = genai.types.GenerationConfig(
+            temperature=0.7,
+            top_p=0.95,
+            top_k=40,
+            max_output_tokens=800,
+        )
+        self.prompt_tmpl = """
 
         You are a FAUX an AI assistant developed by Gabriel that answers questions based on the provided context from documents.
 
@@ -44,16 +43,23 @@ class LLMService:
         - Cite specific information from the context when relevant
 
         Answer:"""
+        logger.info("Gemini initialized successfully")
+    
+    def generate_response(self, query: str, context: str) -> str:
+        """
+        Generate response based on query and context
+        Args:
+            query: User's question
+            context: Retrieved document context  
+        Returns:
+            Generated response
+        """
+        prompt = self.prompt_tmpl.format(context=context, query=query)
 
         try:
           response = self.model.generate_content(
               prompt,
-              generation_config=genai.types.GenerationConfig(
-                  temperature=0.7,
-                  top_p=0.95,
-                  top_k=40,
-                  max_output_tokens=800,
-              )
+              generation_config=self.gen_cfg
           )
           
           return response.text   
@@ -61,5 +67,39 @@ class LLMService:
             logger.error(f"Error generating response: {str(e)}")
             raise Exception(f"Failed to generate response: {str(e)}")
 
+    async def generate_response_async(self, query: str, context: str) -> str:
+        """
+        Non-streaming answer for the /chat endpoint, the Gemini call blocks
+        for the whole generation so it runs on the thread pool
+
+        Returns:
+            Generated response
+        """
+        return await run_blocking(self.generate_response, query=query, context=context)
+
+    def generate_response_stream(self, query: str, context: str) -> Iterator[str]:
+        """
+        Generate response based on query and context, yielding text as Gemini produces it
+        Args:
+            query: User's question
+            context: Retrieved document context
+        Returns:
+            Iterator over response text chunks
+        """
+        prompt = self.prompt_tmpl.format(context=context, query=query)
+
+        try:
+          response = self.model.generate_content(
+              prompt,
+              generation_config=self.gen_cfg,
+              stream=True
+          )
+
+          for chunk in response:
+              yield chunk.text
+        except Exception as e:
+            logger.error(f"Error streaming response: {str(e)}")
+            raise Exception(f"Failed to generate response: {str(e)}")
+
 # Singleton instance
 llm_service = LLMService()
\ No newline at end of file
@@ -1,10 +1,14 @@
 # app/services/vector_store.py
 from pinecone import Pinecone, ServerlessSpec
 from typing import List, Dict, Optional
+import numpy as np
 import logging
 import time
 
-from app.config import PINECONE_API_KEY, PINECONE_INDEX_NAME
+from app.config import (
+    PINECONE_API_KEY, PINECONE_INDEX_NAME, PINECONE_UPSERT_CONCURRENCY
+)
+from app.services.executors import run_blocking
 
 logger = logging.getLogger(__name__)
 
@@ -25,8 +29,11 @@ class VectorStore:
         # Create index if it doesn't exist
         self._ensure_index_exists()
         
-        # Connect to index
-        self.index = self.pc.Index(self.index_name)
+        # Connect to index, pool_threads bounds concurrent async_req calls
+        self.index = self.pc.Index(
+            self.index_name,
+            pool_threads=PINECONE_UPSERT_CONCURRENCY
+        )
         logger.info(f"Connected to Pinecone index: {self.index_name}")
     
     def _ensure_index_exists(self, dimension: int = 384):
@@ -65,8 +72,9 @@ class VectorStore:
         file_id: str,
         filename: str,
         chunks: List[str],
-        embeddings: List[List[float]],
-        additional_metadata: Optional[Dict] = None
+        embeddings: np.ndarray,
+        additional_metadata: Optional[Dict] = None,
+        start_index: int = 0
     ) -> int:
         """
         Store chunks with their embeddings in Pinecone
@@ -75,8 +83,10 @@ class VectorStore:
             file_id: Unique identifier for the file
             filename: Original filename
             chunks: List of text chunks
-            embeddings: List of embedding vectors
+            embeddings: float32 array of embedding vectors, one row per chunk
             additional_metadata: Optional additional metadata to store
+            start_index: Position of the first chunk in the document, when
+                storing a document in several calls
             
         Returns:
             Number of vectors upserted
@@ -86,45 +96,83 @@ class VectorStore:
         
         logger.info(f"Upserting {len(chunks)} chunks for file {file_id}")
         
+        # Metadata shared by every chunk of the file, built once
+        base_meta = {
+            "file_id": file_id,
+            "filename": filename,
+            **(additional_metadata or {})
+        }
+        
         # Prepare vectors for upsert
         vectors = []
-        for idx, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+        for idx, (chunk, embedding) in enumerate(zip(chunks, embeddings), start=start_index):
             vector_id = f"{file_id}_chunk_{idx}"
             
-            metadata = {
-                "file_id": file_id,
-                "filename": filename,
-                "chunk_index": idx,
-                "chunk_text": chunk[:1000],  # Pinecone has metadata size limits (40KB)
-                "text_length": len(chunk)
-            }
-            
-            # Add any additional metadata
-            if additional_metadata:
-                metadata.update(additional_metadata)
-            
             vectors.append({
                 "id": vector_id,
-                "values": embedding,
-                "metadata": metadata
+                "values": embedding.tolist(),
+                "metadata": {
+                    **base_meta,
+                    "chunk_index": idx,
+                    # Pinecone has metadata size limits (40KB)
+                    "chunk_text": chunk if len(chunk) <= 1000 else chunk[:1000],
+                    "text_length": len(chunk)
+                }
             })
         
-        # Upsert in batches (Pinecone recommends batches of 100)
+        # Upsert in batches (Pinecone recommends batches of 100), all fired at
+        # once on the index thread pool and then awaited
         batch_size = 100
-        total_upserted = 0
+        handles = [
+            self.index.upsert(vectors=vectors[i:i + batch_size], async_req=True)
+            for i in range(0, len(vectors), batch_size)
+        ]
         
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i + batch_size]
-            self.index.upsert(vectors=batch)
-            total_upserted += len(batch)
+        total_upserted = 0
+        for handle in handles:
+            total_upserted += handle.get().upserted_count
             logger.info(f"Upserted batch: {total_upserted}/{len(vectors)}")
         
         logger.info(f"Successfully upserted {total_upserted} vectors")
         return total_upserted
     
+    async def upsert_chunks_async(
+        self,
+        file_id: str,
+        filename: str,
+        chunks: List[str],
+        embeddings: np.ndarray,
+        additional_metadata: Optional[Dict] = None,
+        start_index: int = 0
+    ) -> int:
+        """
+        Store chunks without blocking the event loop, the upload pipeline keeps
+        several of these in flight while the next batch is embedded
+
+        Args:
+            file_id: Unique identifier for the file
+            filename: Original filename
+            chunks: List of text chunks
+            embeddings: float32 array of embedding vectors, one row per chunk
+            additional_metadata: Optional additional metadata to store
+            start_index: Position of the first chunk in the document
+
+        Returns:
+            Number of vectors upserted
+        """
+        return await run_blocking(
+            self.upsert_chunks,
+            file_id,
+            filename,
+            chunks,
+            embeddings,
+            additional_metadata,
+            start_index
+        )
+    
     def search(
         self,
-        query_embedding: List[float],
+        query_embedding: np.ndarray,
         top_k: int = 5,
         filter_dict: Optional[Dict] = None
     ) -> Dict:
@@ -142,7 +190,7 @@ class VectorStore:
         logger.info(f"Searching for top {top_k} similar chunks")
         
         results = self.index.query(
-            vector=query_embedding,
+            vector=query_embedding.tolist(),
             top_k=top_k,
             include_metadata=True,
             filter=filter_dict
@@ -151,6 +199,25 @@ class VectorStore:
         logger.info(f"Found {len(results.matches)} matches")
         return results
     
+    async def search_async(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 5,
+        filter_dict: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Query Pinecone from a chat request, the round trip runs on the thread pool
+
+        Args:
+            query_embedding: Query vector
+            top_k: Number of results to return
+            filter_dict: Optional metadata filter (e.g., {"file_id": "abc123"})
+
+        Returns:
+            Search results with matches
+        """
+        return await run_blocking(self.search, query_embedding, top_k, filter_dict)
+    
     def delete_by_file_id(self, file_id: str) -> bool:
         """
         Delete all chunks associated with a file
@@ -172,6 +239,16 @@ class VectorStore:
             logger.error(f"Failed to delete chunks: {str(e)}")
             return False
     
+    async def delete_by_file_id_async(self, file_id: str) -> bool:
+        """
+        Delete a file's chunks from an async handler, used by delete and by
+        upload cleanup after a failed upsert
+
+        Returns:
+            True if deletion was successful
+        """
+        return await run_blocking(self.delete_by_file_id, file_id)
+    
     def get_index_stats(self) -> Dict:
         """
         Get statistics about the index
@@ -186,5 +263,9 @@ class VectorStore:
             "index_fullness": stats.index_fullness
         }
 
+    async def get_index_stats_async(self) -> Dict:
+        """Index statistics for the /upload/stats endpoint, fetched off the event loop"""
+        return await run_blocking(self.get_index_stats)
+
 # Create singleton instance
 vector_store = VectorStore()
\ No newline at end of file
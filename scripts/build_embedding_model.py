@@ -0,0 +1,110 @@
+"""
+Build the ONNX embedding model used by app.services.embeddings
+
+Run once at build time from the project root:
+    python -m scripts.build_embedding_model
+"""
+from optimum.onnxruntime import ORTQuantizer
+from optimum.onnxruntime.configuration import AutoQuantizationConfig
+from onnx import helper, numpy_helper, TensorProto
+import numpy as np
+import onnx
+import subprocess
+import logging
+
+from app.config import EMBEDDING_MODEL, EMBEDDING_ONNX_DIR, EMBEDDING_ONNX_INT8_DIR
+
+logger = logging.getLogger(__name__)
+
+def export_onnx() -> None:
+  """
+  Export the sentence transformer to ONNX with O3 graph optimizations
+  (transformer fusions, fast gelu) applied
+  """
+  logger.info(f"Exporting {EMBEDDING_MODEL} to {EMBEDDING_ONNX_DIR}")
+
+  # library-name transformers keeps the raw last_hidden_state output,
+  # pooling is appended to the graph by fuse_pooling
+  subprocess.run(
+    [
+      "optimum-cli", "export", "onnx",
+      "--model", f"sentence-transformers/{EMBEDDING_MODEL}",
+      "--task", "feature-extraction",
+      "--library-name", "transformers",
+      "--optimize", "O3",
+      str(EMBEDDING_ONNX_DIR),
+    ],
+    check=True
+  )
+
+def fuse_pooling() -> None:
+  """
+  Append masked mean pooling and L2 normalization to the exported graph, so
+  one session.run returns final sentence vectors as the sentence_embedding output
+  """
+  model_path = EMBEDDING_ONNX_DIR / "model.onnx"
+  logger.info(f"Fusing pooling into {model_path}")
+
+  model = onnx.load(model_path)
+  graph = model.graph
+  opset = next(o.version for o in model.opset_import if o.domain in ("", "ai.onnx"))
+
+  hidden = next(o for o in graph.output if o.name == "last_hidden_state")
+  hidden_size = hidden.type.tensor_type.shape.dim[-1].dim_value
+
+  graph.initializer.extend([
+    numpy_helper.from_array(np.array(1e-9, dtype=np.float32), "pool_count_eps"),
+    numpy_helper.from_array(np.array(1e-12, dtype=np.float32), "pool_norm_eps"),
+  ])
+
+  def with_axes(op, inputs, output, axes, **attrs):
+    # axes moved from attribute to input in opset 13 for ReduceSum/Unsqueeze
+    if opset >= 13:
+      name = f"{output}_axes"
+      graph.initializer.append(numpy_helper.from_array(np.array(axes, dtype=np.int64), name))
+      return helper.make_node(op, inputs + [name], [output], **attrs)
+    return helper.make_node(op, inputs, [output], axes=axes, **attrs)
+
+  graph.node.extend([
+    helper.make_node("Cast", ["attention_mask"], ["pool_mask"], to=TensorProto.FLOAT),
+    with_axes("Unsqueeze", ["pool_mask"], "pool_mask_3d", [2]),
+
+    # mean over real tokens only, padding is masked out
+    helper.make_node("Mul", ["last_hidden_state", "pool_mask_3d"], ["pool_masked"]),
+    with_axes("ReduceSum", ["pool_masked"], "pool_sum", [1], keepdims=0),
+    with_axes("ReduceSum", ["pool_mask_3d"], "pool_count", [1], keepdims=0),
+    helper.make_node("Max", ["pool_count", "pool_count_eps"], ["pool_count_safe"]),
+    helper.make_node("Div", ["pool_sum", "pool_count_safe"], ["pool_mean"]),
+
+    # unit length so inner product == cosine
+    helper.make_node("Mul", ["pool_mean", "pool_mean"], ["pool_sq"]),
+    with_axes("ReduceSum", ["pool_sq"], "pool_sq_sum", [1], keepdims=1),
+    helper.make_node("Sqrt", ["pool_sq_sum"], ["pool_norm"]),
+    helper.make_node("Max", ["pool_norm", "pool_norm_eps"], ["pool_norm_safe"]),
+    helper.make_node("Div", ["pool_mean", "pool_norm_safe"], ["sentence_embedding"]),
+  ])
+
+  # only the sentence vectors leave the graph
+  del graph.output[:]
+  graph.output.append(helper.make_tensor_value_info(
+    "sentence_embedding", TensorProto.FLOAT, ["batch_size", hidden_size]
+  ))
+
+  onnx.save(model, model_path)
+
+def quantize_int8() -> None:
+  """
+  Dynamic int8 quantization of the exported model, per channel weights
+  targeting the avx512 vnni kernels
+  """
+  logger.info(f"Quantizing {EMBEDDING_ONNX_DIR} to {EMBEDDING_ONNX_INT8_DIR}")
+
+  qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=True)
+  quantizer = ORTQuantizer.from_pretrained(EMBEDDING_ONNX_DIR)
+  quantizer.quantize(save_dir=EMBEDDING_ONNX_INT8_DIR, quantization_config=qconfig)
+
+if __name__ == "__main__":
+  logging.basicConfig(level=logging.INFO)
+  export_onnx()
+  fuse_pooling()
+  quantize_int8()